@@ -1,11 +1,18 @@
-from Crypto.Cipher import AES
+import functools
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
 from Crypto.Protocol.KDF import PBKDF2
 from Crypto.Hash import SHA256
 from hashlib import sha256, md5
 
 
+# AESGCM refuses inputs of 2**31 bytes or more, larger data goes through the streaming GCM cipher
+_AESGCM_MAX_SIZE = 2**31 - 1
+
 class FS_Crypto:
-    """Encryption and Decryption class. It also hashes data using MD5."""
+    """Encryption and Decryption class. It also hashes data: SHA256 for identifiers,
+    MD5 for the metadata key salt and legacy identifiers."""
 
     # derive aes key and aes nonce from password and salt
     @staticmethod
@@ -13,25 +20,127 @@ class FS_Crypto:
         blob = PBKDF2(password, salt, dkLen=44, count=iterations, hmac_hash_module=SHA256)
         return blob[:32], blob[32:]
     
-    # AES GCM encryption
+    # AESGCM contexts hold the expanded key. only the long-lived master and metadata keys are
+    # kept for reuse when encrypting (reuse_key=True), per-file keys are used once and never cached.
+    # decrypting never caches, a key from a wrong password would otherwise stay in memory
+    @staticmethod
+    @functools.lru_cache(maxsize=4)
+    def _aead(key: bytes) -> AESGCM:
+        return AESGCM(key)
+
+    # AES GCM encryption, AESGCM returns ciphertext + tag but the tag is stored first
     @staticmethod
-    def encrypt(data: bytes, key: bytes, nonce: bytes) -> bytes:
-        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
-        ciphertext, tag = cipher.encrypt_and_digest(data)
+    def encrypt(data: bytes, key: bytes, nonce: bytes, reuse_key: bool = False) -> bytes:
+        if len(data) > _AESGCM_MAX_SIZE:
+            return FS_Crypto._encrypt_large(data, key, nonce)
+        aead = FS_Crypto._aead(key) if reuse_key else AESGCM(key)
+        sealed = aead.encrypt(nonce, data, None)
 
-        return tag + ciphertext
+        return b"".join((sealed[-16:], memoryview(sealed)[:-16]))
     
     # AES GCM decryption
     @staticmethod
     def decrypt(encrypted_data: bytes, key: bytes, nonce: bytes) -> bytes:
+        if len(encrypted_data) > _AESGCM_MAX_SIZE:
+            return FS_Crypto._decrypt_large(encrypted_data, key, nonce)
         tag = encrypted_data[:16]
         ciphertext = encrypted_data[16:]
 
-        cipher = AES.new(key, AES.MODE_GCM, nonce=nonce)
+        try:
+            return AESGCM(key).decrypt(nonce, b"".join((ciphertext, tag)), None)
+        except InvalidTag:
+            raise ValueError("MAC check failed")
+
+    # same as encrypt for data AESGCM can't take at once, returned as a bytearray to avoid another copy
+    @staticmethod
+    def _encrypt_large(data, key: bytes, nonce: bytes) -> bytearray:
+        encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+
+        sealed = bytearray(16)
+        for chunk in FS_Crypto._read_chunks(data, 1 << 20):
+            sealed += encryptor.update(chunk)
+        sealed += encryptor.finalize()
+        sealed[:16] = encryptor.tag
+
+        return sealed
 
-        return cipher.decrypt_and_verify(ciphertext, tag)
+    # same as decrypt for data AESGCM can't take at once
+    @staticmethod
+    def _decrypt_large(encrypted_data, key: bytes, nonce: bytes) -> bytearray:
+        with memoryview(encrypted_data) as view:
+            decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce, bytes(view[:16]))).decryptor()
+
+            data = bytearray()
+            for chunk in FS_Crypto._read_chunks(view[16:], 1 << 20):
+                data += decryptor.update(chunk)
+
+        try:
+            data += decryptor.finalize()
+        except InvalidTag:
+            raise ValueError("MAC check failed")
+
+        return data
+
+    # AES GCM encryption of a binary stream or an in-memory buffer into a seekable binary stream,
+    # same tag + ciphertext layout as encrypt() but only one chunk is held in memory at a time
+    @staticmethod
+    def encrypt_stream(in_fp, out_fp, key: bytes, nonce: bytes, chunk_size: int = 1 << 20):
+        encryptor = Cipher(algorithms.AES(key), modes.GCM(nonce)).encryptor()
+
+        # reserve room for the tag, it is only known once everything has been encrypted
+        tag_position = out_fp.tell()
+        out_fp.write(bytes(16))
+        for chunk in FS_Crypto._read_chunks(in_fp, chunk_size):
+            out_fp.write(encryptor.update(chunk))
+        out_fp.write(encryptor.finalize())
+
+        end_position = out_fp.tell()
+        out_fp.seek(tag_position)
+        out_fp.write(encryptor.tag)
+        out_fp.seek(end_position)
+
+    # AES GCM decryption of a binary stream into a binary stream or a bytearray,
+    # raises ValueError once the whole input has been read if the tag does not match
+    @staticmethod
+    def decrypt_stream(in_fp, out_fp, key: bytes, nonce: bytes, chunk_size: int = 1 << 20):
+        tag = in_fp.read(16)
+        decryptor = Cipher(algorithms.AES(key), modes.GCM(nonce, tag)).decryptor()
+
+        write = out_fp.extend if isinstance(out_fp, bytearray) else out_fp.write
+        for chunk in FS_Crypto._read_chunks(in_fp, chunk_size):
+            write(decryptor.update(chunk))
+
+        try:
+            write(decryptor.finalize())
+        except InvalidTag:
+            raise ValueError("MAC check failed")
+
+    # yield fixed-size chunks from a binary stream, or zero-copy slices of an in-memory buffer
+    @staticmethod
+    def _read_chunks(source, chunk_size: int):
+        if hasattr(source, "read"):
+            while True:
+                chunk = source.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+        else:
+            with memoryview(source) as view:
+                for offset in range(0, len(view), chunk_size):
+                    yield view[offset:offset + chunk_size]
     
-    # hash data using MD5
+    # hash data using SHA256, truncated to 16 bytes so identifiers keep their size
     @staticmethod
     def get_hash(data: bytes) -> str:
+        return sha256(data).hexdigest()[:32]
+    
+    # salt of the metadata key, the MD5 of the password. it must never change
+    # or metadata files written before would no longer decrypt
+    @staticmethod
+    def get_metadata_salt(password: str) -> bytes:
+        return md5(password.encode()).hexdigest().encode()
+
+    # MD5 hash the original identifiers were made with, kept to recognize existing filesystems
+    @staticmethod
+    def get_legacy_hash(data: bytes) -> str:
         return md5(data).hexdigest()
\ No newline at end of file
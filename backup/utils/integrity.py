@@ -1,81 +1,128 @@
 import os
-import inspect
+import ast
+import mmap
+import tokenize
 import hashlib
-import pickle
-import importlib
+import msgpack
+import shutil
+import itertools
+import concurrent.futures
 
 
-# SHA256 hash every file in the project directory and its subdirectories
+# project root, one level above utils/
+_PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+# hashlib.file_digest (Python 3.11+) feeds the file to OpenSSL's SHA256, which uses the
+# CPU's SHA extensions when available, through one reused buffer instead of a full read
+if hasattr(hashlib, "file_digest"):
+    def _sha256_file(f):
+        return hashlib.file_digest(f, "sha256")
+else:
+    def _sha256_file(f):
+        hasher = hashlib.sha256()
+        for chunk in iter(lambda: f.read(1 << 18), b""):
+            hasher.update(chunk)
+        return hasher
+
+# below this size reading a file is cheaper than setting up a mapping for it
+_MMAP_THRESHOLD = 16 * 1024
+
+# SHA256 hash every file in the project directory and its subdirectories,
+# as the raw 32-byte digest (empty if the file can't be read)
 def calculate_file_hash(filepath):
     if not os.path.exists(filepath):
-        return ""
+        return b""
     
     try:
-        with open(filepath, 'rb') as f:
-            file_data = f.read()
-        return hashlib.sha256(file_data).hexdigest()
+        with open(filepath, 'rb', buffering=0) as f:
+            file_size = os.fstat(f.fileno()).st_size
+            if file_size == 0:
+                return hashlib.sha256().digest()
+            if file_size < _MMAP_THRESHOLD:
+                return hashlib.sha256(f.read()).digest()
+            
+            # larger files are mapped so the hash reads their pages without a user-space copy,
+            # files that can't be mapped are streamed instead
+            try:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return hashlib.sha256(mapped).digest()
+            except (OSError, ValueError):
+                return _sha256_file(f).digest()
     except Exception:
-        return ""
+        return b""
 
-# get all functions in a module and their source codes
-def get_module_functions(module):
-    return {name: obj for name, obj in inspect.getmembers(module, inspect.isfunction)
-            if obj.__module__ == module.__name__}
+# get the top-level functions and classes of a .py file with their source codes from a
+# single parse, without importing (and running) the module. sources are cut the same way
+# inspect.getsource does: from the first decorator to the end of the body
+def _extract_defs(filepath):
+    with tokenize.open(filepath) as f:
+        lines = f.readlines()
+    # like linecache, which inspect reads sources through, terminate the last line
+    if lines and not lines[-1].endswith('\n'):
+        lines[-1] += '\n'
+    tree = ast.parse("".join(lines), filepath)
+    
+    functions = {}
+    classes = {}
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            sources = functions
+        elif isinstance(node, ast.ClassDef):
+            sources = classes
+        else:
+            continue
+        start = min([decorator.lineno for decorator in node.decorator_list] + [node.lineno])
+        sources[node.name] = "".join(lines[start - 1:node.end_lineno])
+    
+    return functions, classes
 
-# get all classes in a module and their source codes
-def get_module_classes(module):
-    return {name: obj for name, obj in inspect.getmembers(module, inspect.isclass)
-            if obj.__module__ == module.__name__}
+# yield the path of every .py file under root. scandir entries carry their type,
+# so directories are told apart without extra syscalls
+def _iter_py(root):
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.name.endswith('.py') and entry.is_file():
+                    yield entry.path
+
+# get the functions and classes of a .py file with source codes, None if it can't be read or parsed
+def _introspect(filepath):
+    try:
+        return _extract_defs(filepath)
+    except (OSError, SyntaxError, ValueError):
+        return None
 
 # scan the project directory for .py files, calculate their hashes,
-# and store their functions and classes with source codes in a dictionary
+# and store their functions and classes with source codes in a dictionary.
+# hashing releases the GIL so it runs in threads while this thread parses the files,
+# worker processes would cost more to start than the few small files take to parse
 def generate_integrity_data():
+    project_dir = _PROJECT_DIR
+    
+    filepaths = list(_iter_py(project_dir))
+    
     integrity_data = {}
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    
-    for root, _, files in os.walk(project_dir):
-        for file in files:
-            if file.endswith('.py'):
-                filepath = os.path.join(root, file)
-                rel_path = os.path.relpath(filepath, project_dir)
-                file_hash = calculate_file_hash(filepath)
-                module_path = os.path.splitext(rel_path)[0].replace(os.sep, '.')
-                module = None
-                
-                try:
-                    module = importlib.import_module(module_path)
-                    
-                    # get functions and their source codes
-                    functions = get_module_functions(module)
-                    function_sources = {
-                        name: inspect.getsource(func)
-                        for name, func in functions.items()
-                    }
-                    
-                    # get classes and their source codes
-                    classes = get_module_classes(module)
-                    class_sources = {
-                        name: inspect.getsource(cls)
-                        for name, cls in classes.items()
-                    }
-                    
-                    integrity_data[rel_path] = {
-                        'hash': file_hash,
-                        'functions': function_sources,
-                        'classes': class_sources
-                    }
-                except (ImportError, ModuleNotFoundError):
-                    integrity_data[rel_path] = {
-                        'hash': file_hash
-                    }
+    with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+        for filepath, file_hash in zip(filepaths, executor.map(calculate_file_hash, filepaths)):
+            entry = {'hash': file_hash}
+            defs = _introspect(filepath)
+            if defs is not None:
+                entry['functions'], entry['classes'] = defs
+            integrity_data[os.path.relpath(filepath, project_dir)] = entry
     
     return integrity_data
 
-# write hashes, functions, and classes to a file after serializing the data with pickle
+# write hashes, functions, and classes to a file after serializing the data with msgpack,
+# unlike pickle loading it back can't run code planted in the file
 def save_integrity_data(data, output_path):
     try:
         with open(output_path, 'wb') as f:
-            pickle.dump(data, f)
+            f.write(msgpack.packb(data, use_bin_type=True))
     except Exception as e:
         print(f"Error saving integrity data: {e}")
 
@@ -85,59 +132,43 @@ def load_integrity_data(input_path):
     
     try:
         with open(input_path, 'rb') as f:
-            return pickle.load(f)
+            return msgpack.unpackb(f.read(), raw=False)
     except Exception:
         return None
 
 # verify hashes
-def verify_file_integrity(filepath, stored_data):
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+def verify_file_integrity(filepath, stored_data, project_dir=_PROJECT_DIR):
     rel_path = os.path.relpath(filepath, project_dir)
     
-    if rel_path not in stored_data:
+    entry = stored_data.get(rel_path)
+    if entry is None:
         return False, f"File {rel_path} not found in integrity data"
     
     current_hash = calculate_file_hash(filepath)
-    if current_hash != stored_data[rel_path]['hash']:
+    if current_hash == entry['hash']:
+        return True, ""
+    
+    # the file has changed, its stored members are compared with the ones in the file on disk
+    # (parsed, never imported) only to tell which function or class was modified
+    try:
+        current_functions, current_classes = _extract_defs(filepath)
+    except (OSError, SyntaxError, ValueError):
         return False, f"File {rel_path} has been modified"
     
-    module_path = os.path.splitext(rel_path)[0].replace(os.sep, '.')
+    for name, stored_source in (entry.get('functions') or {}).items():
+        current_source = current_functions.get(name)
+        if current_source is not None and current_source != stored_source:
+            return False, f"Function {name} in {rel_path} has been modified"
     
-    try:
-        module = importlib.import_module(module_path)
-        
-        if 'functions' in stored_data[rel_path]:
-            for name, stored_source in stored_data[rel_path]['functions'].items():
-                if hasattr(module, name):
-                    func = getattr(module, name)
-                    if inspect.isfunction(func):
-                        try:
-                            current_source = inspect.getsource(func)
-                            if current_source != stored_source:
-                                return False, f"Function {name} in {rel_path} has been modified"
-                        except Exception:
-                            pass
-        
-        if 'classes' in stored_data[rel_path]:
-            for name, stored_source in stored_data[rel_path]['classes'].items():
-                if hasattr(module, name):
-                    cls = getattr(module, name)
-                    if inspect.isclass(cls):
-                        try:
-                            current_source = inspect.getsource(cls)
-                            if current_source != stored_source:
-                                return False, f"Class {name} in {rel_path} has been modified"
-                        except Exception:
-                            pass
-    except (ImportError, ModuleNotFoundError):
-        pass
-    
-    return True, ""
-
+    for name, stored_source in (entry.get('classes') or {}).items():
+        current_source = current_classes.get(name)
+        if current_source is not None and current_source != stored_source:
+            return False, f"Class {name} in {rel_path} has been modified"
+    
+    return False, f"File {rel_path} has been modified"
 
 def verify_integrity():
-    integrity_file = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                                 'integrity.dat')
+    integrity_file = os.path.join(_PROJECT_DIR, 'integrity.dat')
     
     # initialize integrity data if it does not exist
     stored_data = load_integrity_data(integrity_file)
@@ -147,46 +178,47 @@ def verify_integrity():
         save_integrity_data(stored_data, integrity_file)
         return True
     
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    project_dir = _PROJECT_DIR
     all_valid = True
     
-    # scan the project directory for .py files and verify their integrity
-    for root, _, files in os.walk(project_dir):
-        for file in files:
-            if file.endswith('.py'):
-                filepath = os.path.join(root, file)
-                rel_path = os.path.relpath(filepath, project_dir)
-                is_valid, message = verify_file_integrity(filepath, stored_data)
-                
-                if not is_valid:
-                    print(f"Integrity violation: {message}")
-                    all_valid = False
+    # verify the integrity of every file in the integrity data, a removed file fails its hash check.
+    # hashing releases the GIL so threads are enough to check files in parallel
+    filepaths = [os.path.join(project_dir, rel_path) for rel_path in stored_data]
+    
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        for is_valid, message in executor.map(verify_file_integrity, filepaths, itertools.repeat(stored_data), itertools.repeat(project_dir)):
+            if not is_valid:
+                print(f"Integrity violation: {message}")
+                all_valid = False
+    
+    # scan the project directory only for .py files added since the integrity data was generated
+    for filepath in _iter_py(project_dir):
+        rel_path = os.path.relpath(filepath, project_dir)
+        if rel_path not in stored_data:
+            print(f"Integrity violation: File {rel_path} not found in integrity data")
+            all_valid = False
     
     return all_valid
 
 # copy original files from the backup directory to the project directory
 def restore_original_files():
-    backup_dir = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 
-                             'backup')
+    backup_dir = os.path.join(_PROJECT_DIR, 'backup')
     
     if not os.path.exists(backup_dir):
         print("Backup directory not found. Cannot restore files.")
         return
     
-    project_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    project_dir = _PROJECT_DIR
     
-    for root, _, files in os.walk(backup_dir):
-        for file in files:
-            if file.endswith('.py'):
-                backup_file = os.path.join(root, file)
-                rel_path = os.path.relpath(backup_file, backup_dir)
-                target_file = os.path.join(project_dir, rel_path)
+    for backup_file in _iter_py(backup_dir):
+        rel_path = os.path.relpath(backup_file, backup_dir)
+        target_file = os.path.join(project_dir, rel_path)
 
-                os.makedirs(os.path.dirname(target_file), exist_ok=True)
+        os.makedirs(os.path.dirname(target_file), exist_ok=True)
 
-                try:
-                    with open(backup_file, 'rb') as src, open(target_file, 'wb') as dst:
-                        dst.write(src.read())
-                    print(f"Restored {rel_path}")
-                except Exception as e:
-                    print(f"Failed to restore {rel_path}: {e}")
\ No newline at end of file
+        try:
+            # copies in the kernel where the platform supports it
+            shutil.copyfile(backup_file, target_file)
+            print(f"Restored {rel_path}")
+        except Exception as e:
+            print(f"Failed to restore {rel_path}: {e}")
\ No newline at end of file
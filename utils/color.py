@@ -1,5 +1,9 @@
 import colorama
 
+
+# looked up once instead of on every printed line
+_RESET = colorama.Style.RESET_ALL
+
 class Color:
     """Handle colored terminal output using colorama."""
     
@@ -17,4 +21,4 @@ class Color:
         self.WARNING = colorama.Fore.YELLOW
 
     def _print(self, text, color):
-        print(f"{color}{text}{colorama.Style.RESET_ALL}")
\ No newline at end of file
+        print(color, text, _RESET, sep="")
\ No newline at end of file
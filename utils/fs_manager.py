@@ -1,44 +1,96 @@
 import os
+import mmap
+import functools
 import uuid
-import winreg
+import itertools
+import contextlib
+import concurrent.futures
 import platform
 from datetime import datetime
 from .fs_crypto import FS_Crypto
 from .fs_metadata import Metadata
 from .color import Color
 
+try:
+    import winreg
+except ImportError:
+    winreg = None
+
 
 color = Color()
 
+# each machine has a unique MachineGuid value in the registry so we can use it as an identifier.
+# it can't change while the program runs so it is only queried once, other systems fall back to the host name
+try:
+    with winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft\Cryptography") as _key:
+        _MACHINE_GUID = winreg.QueryValueEx(_key, "MachineGuid")[0]
+except (AttributeError, OSError):
+    _MACHINE_GUID = platform.node()
+# hash it so people can't easily guess it
+_MACHINE_ID_HASH = FS_Crypto.get_hash(_MACHINE_GUID.encode())
+# filesystems created before the switch to SHA256 carry the MD5 identifier
+_LEGACY_MACHINE_ID_HASH = FS_Crypto.get_legacy_hash(_MACHINE_GUID.encode())
+
+# known plaintext sealed with the master key and stored in the metadata, decrypting it proves a password
+_PASSWORD_CHECK = b"MYFS-OK"
+
+# PBKDF2 is slow on purpose, master keys derived again from the same password and salt
+# (verify, load) are served from memory for the rest of the session. per-file passwords
+# are never cached
+@functools.lru_cache(maxsize=16)
+def _derive_key_cached(password: str, salt: bytes):
+    return FS_Crypto.derive_key(password, salt)
+
+# map a file opened for reading instead of copying it into a bytes object,
+# empty files can't be mapped so they are returned as empty bytes
+def _map_file(f):
+    if os.fstat(f.fileno()).st_size == 0:
+        return contextlib.nullcontext(b"")
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
 class MyFSManager:
     """File System Manager class"""
 
     def __init__(self, disk_name="MyFS.DRI"):
         self.disk_name = disk_name
         self.file_table = []
+        # file id -> record in file_table
+        self._by_id = {}
+        # number of active and soft-deleted records in file_table
+        self._active = 0
+        self._deleted = 0
         self.master_key = None
         self.nonce = None
         self.metadata = None
         self.is_initialized = False
         self.access_password = None
         self.header = b"MyFS\x00"
+        # decrypted disk content, kept in memory for the whole session
+        self._plain = None
+        # whether the disk file holds ciphertext, tracked instead of reading it back
+        self._encrypted_on_disk = False
+        # unsaved changes to the disk content and to the metadata only (file table),
+        # both are flushed together by save_filesystem
+        self._dirty = False
+        self._metadata_dirty = False
+        # per-file salts are cut from one larger urandom read
+        self._salt_pool = b""
+        self._salt_offset = 0
     
     def verify_password(self, input_access_password):
         if not self.is_initialized:
             raise ValueError("Filesystem is not initialized.")
         
-        # try decrypting the metadata and filesystem with the provided password
+        # try decrypting the metadata and the password verifier with the provided password,
+        # the verifier is sealed with the master key so the disk itself does not need to be touched
         try:
             temp_metadata = Metadata.read_metadata(input_access_password)
-            temp_master_key, temp_nonce = FS_Crypto.derive_key(
+            temp_master_key, temp_nonce = _derive_key_cached(
                 input_access_password,
                 temp_metadata["salt"]
             )
-            with open(self.disk_name, 'rb') as f:
-                encrypted_data = f.read()
-            decrypted_data = FS_Crypto.decrypt(encrypted_data, temp_master_key, nonce=temp_nonce)
-            if decrypted_data is not None:
-                return True
+            FS_Crypto.decrypt(temp_metadata["verifier"], temp_master_key, nonce=temp_nonce)
+            return True
         except Exception as e:
             color._print(f"Password verification failed: {e}", color.WRONG)
             return False
@@ -50,25 +102,29 @@ class MyFSManager:
         # verify old password
         if not self.verify_password(old_password):
             raise ValueError("Old password is incorrect.")
-        
-        # decrypt with old credentials
-        if self._is_encrypted():
-            self._decrypt_filesystem()
+        # forget the keys of the old password
+        _derive_key_cached.cache_clear()
+        FS_Crypto._aead.cache_clear()
 
         # set new master key and nonce
         salt = os.urandom(16)
         new_master_key, new_nonce = FS_Crypto.derive_key(new_password, salt)
         
+        verifier = FS_Crypto.encrypt(_PASSWORD_CHECK, new_master_key, nonce=new_nonce, reuse_key=True)
+        
         self.metadata["salt"] = salt
-        Metadata.update_metadata("salt", salt)
+        self.metadata["verifier"] = verifier
+        Metadata.update_many({"salt": salt, "verifier": verifier})
         Metadata.write_metadata(new_password)
         
         self.master_key = new_master_key
         self.nonce = new_nonce
         self.access_password = new_password
         
-        # re-encrypt filesystem with new credentials
-        self._encrypt_filesystem()
+        # re-encrypt filesystem with new credentials right away,
+        # the metadata on the USB drive already uses the new password
+        self._dirty = True
+        self.save_filesystem()
 
     def initialize_filesystem(self, access_password):
         salt = os.urandom(16)
@@ -77,18 +133,18 @@ class MyFSManager:
         # print(f"Nonce: {self.nonce.hex()}")
         self.access_password = access_password
         creation_time = datetime.now()
-        # each machine has a unique MachineGuid value in the registry so we can use it as an identifier
-        machine_guid = winreg.QueryValueEx(winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft\Cryptography"), "MachineGuid")[0]
-        # hash it so people can't easily guess it
-        identifier = FS_Crypto.get_hash(machine_guid.encode())
+        identifier = _MACHINE_ID_HASH
         # create header with identifier and Windows build version
         self.header += bytes.fromhex(identifier) + b'\x00' + platform.platform().encode() + b'\x00\x01\x02'
 
         # update metadata
-        Metadata.update_metadata("creation_date", creation_time)
-        Metadata.update_metadata("last_modified", creation_time)
-        Metadata.update_metadata("salt", salt)
-        Metadata.update_metadata("identifier", identifier)
+        Metadata.update_many({
+            "creation_date": creation_time,
+            "last_modified": creation_time,
+            "salt": salt,
+            "identifier": identifier,
+            "verifier": FS_Crypto.encrypt(_PASSWORD_CHECK, self.master_key, nonce=self.nonce, reuse_key=True)
+        })
         Metadata.write_metadata(self.access_password)
         self.metadata = Metadata.metadata
 
@@ -104,70 +160,88 @@ class MyFSManager:
         # decrypt metadata and filesystem
         self.access_password = access_password
         self.metadata = Metadata.read_metadata(self.access_password)
-        self.master_key, self.nonce = FS_Crypto.derive_key(
+        self.master_key, self.nonce = _derive_key_cached(
             self.access_password,
             self.metadata["salt"]
         )
         self._decrypt_filesystem()
+        if not self._encrypted_on_disk:
+            raise ValueError("Filesystem is not encrypted. It may have been left decrypted by an interrupted session.")
 
-        with open(self.disk_name, 'rb') as f:
-            try:
-                # verify system if it is the system that created this filesystem
-                machine_guid = winreg.QueryValueEx(winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, r"SOFTWARE\Microsoft\Cryptography"), "MachineGuid")[0]
-                identifier = FS_Crypto.get_hash(machine_guid.encode())
-                disk_id = f.read(len(self.header) + 16 + 25 + 4)
-                if identifier != self.metadata["identifier"] and identifier != disk_id[4:4+16]:
-                    raise ValueError("System fingerprint mismatch. This filesystem can only be used on the original computer.")
-                
-                self.file_table = self.metadata.get("file_table", [])
-                self.is_initialized = True
-                self.header = disk_id
-                
-            except Exception as e:
-                raise ValueError(f"Failed to decrypt filesystem. Incorrect password or corrupted data: {e}")
+        try:
+            # verify system if it is the system that created this filesystem
+            identifiers = (_MACHINE_ID_HASH, _LEGACY_MACHINE_ID_HASH)
+            disk_id = bytes(self._plain[:len(self.header) + 16 + 25 + 4])
+            if self.metadata["identifier"] not in identifiers and disk_id[4:4+16] not in identifiers:
+                raise ValueError("System fingerprint mismatch. This filesystem can only be used on the original computer.")
+            
+            self.file_table = self.metadata.get("file_table", [])
+            self._by_id = {f["id"]: f for f in self.file_table}
+            self._deleted = sum(1 for f in self.file_table if f.get("deleted", False))
+            self._active = len(self.file_table) - self._deleted
+            self.is_initialized = True
+            self.header = disk_id
+            
+        except Exception as e:
+            raise ValueError(f"Failed to decrypt filesystem. Incorrect password or corrupted data: {e}")
         
-        self._encrypt_filesystem()
+        # metadata from an older version is upgraded once the password and the machine are verified,
+        # the verifier it is missing is sealed with the master key
+        if Metadata.is_legacy():
+            Metadata.upgrade_legacy(FS_Crypto.encrypt(_PASSWORD_CHECK, self.master_key, nonce=self.nonce, reuse_key=True))
+            Metadata.write_metadata(self.access_password)
     
     def save_filesystem(self):
         if not self.is_initialized:
             raise ValueError("Filesystem is not initialized.")
+        # nothing changed since the last save
+        if not (self._dirty or self._metadata_dirty):
+            return
         
         # update metadata
         self.metadata["last_modified"] = datetime.now()
         self.metadata["file_count"] = len(self.file_table)
-        self.metadata["deleted_count"] = sum(1 for file in self.file_table if file.get("deleted", False))
-        Metadata.update_metadata("last_modified", self.metadata["last_modified"])
-        Metadata.update_metadata("file_count", self.metadata["file_count"])
-        Metadata.update_metadata("deleted_count", self.metadata["deleted_count"])
-        Metadata.update_metadata("file_table", self.file_table)
+        self.metadata["deleted_count"] = self._deleted
+        Metadata.update_many({
+            "last_modified": self.metadata["last_modified"],
+            "file_count": self.metadata["file_count"],
+            "deleted_count": self.metadata["deleted_count"],
+            "file_table": self.file_table
+        })
         Metadata.write_metadata(self.access_password)
+        self._metadata_dirty = False
 
-        # encrypt file system
-        if not self._is_encrypted():
+        # encrypt file system only if its content has changed since the last save
+        if self._dirty:
             self._encrypt_filesystem()
+            self._dirty = False
     
     def _create_filesystem_structure(self):
-        with open(self.disk_name, 'wb') as f:
-            f.write(self.header)
+        self._plain = bytearray(self.header)
+        self._dirty = True
+        self._metadata_dirty = True
     
+    # write the in-memory disk to the disk file, the disk file is always kept encrypted.
+    # it is written to a temporary file first so an interrupted save never leaves a broken disk
     def _encrypt_filesystem(self):
-        with open(self.disk_name, 'rb') as f:
-            data = f.read()
-        encrypted_data = FS_Crypto.encrypt(data, self.master_key, nonce=self.nonce)
-        with open(self.disk_name, 'wb') as f:
-            f.write(encrypted_data)
+        temp_name = self.disk_name + ".tmp"
+        with open(temp_name, 'wb') as f:
+            FS_Crypto.encrypt_stream(self._plain, f, self.master_key, nonce=self.nonce)
+        os.replace(temp_name, self.disk_name)
+        self._encrypted_on_disk = True
 
+    # load the disk file into memory, it is decrypted only once per session
     def _decrypt_filesystem(self):
+        plain = bytearray()
         with open(self.disk_name, 'rb') as f:
-            encrypted_data = f.read()
-        decrypted_data = FS_Crypto.decrypt(encrypted_data, self.master_key, nonce=self.nonce)
-        with open(self.disk_name, 'wb') as f:
-            f.write(decrypted_data)
-
-    def _is_encrypted(self) -> bool:
-        with open(self.disk_name, 'rb') as f:
-            header = f.read(len(self.header))
-        return not header.startswith(self.header)
+            # the disk state is only read here, a disk that still starts with the plain header was left decrypted
+            self._encrypted_on_disk = not f.read(len(self.header)).startswith(self.header)
+            if not self._encrypted_on_disk:
+                return
+            f.seek(0)
+            FS_Crypto.decrypt_stream(f, plain, self.master_key, nonce=self.nonce)
+        self._plain = plain
+        self._dirty = False
 
     def import_file(self, file_path, file_password):
         if not self.is_initialized:
@@ -176,41 +250,75 @@ class MyFSManager:
             raise FileNotFoundError(f"File {file_path} does not exist.")
         
         # check for maximum file count
-        active_files = sum(1 for file in self.file_table if not file.get("deleted", False))
-        if active_files >= self.metadata["max_files"]:
+        if self._active >= self.metadata["max_files"]:
             raise ValueError(f"Maximum file count ({self.metadata['max_files']}) reached.")
         
-        # read file data and create file record
-        with open(file_path, 'rb') as f:
-            file_data = f.read()
-
+        file_salt = self._next_salt() if file_password else None
+        prepared = self._prepare_import(file_path, file_password, file_salt)
+        return self._add_file(file_path, file_salt, *prepared)
+    
+    # import several files at once, the independent per-file work (key derivation and
+    # encryption) runs in a thread pool and the files are then added in the given order
+    def import_files(self, file_paths, file_passwords):
+        if not self.is_initialized:
+            raise ValueError("Filesystem is not initialized.")
+        if len(file_paths) != len(file_passwords):
+            raise ValueError("Every file needs a password entry (None for no encryption).")
+        for file_path in file_paths:
+            if not os.path.exists(file_path):
+                raise FileNotFoundError(f"File {file_path} does not exist.")
+        
+        # check for maximum file count
+        if self._active + len(file_paths) > self.metadata["max_files"]:
+            raise ValueError(f"Maximum file count ({self.metadata['max_files']}) reached.")
+        
+        file_salts = [self._next_salt() if file_password else None for file_password in file_passwords]
+        with concurrent.futures.ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            prepared = list(executor.map(self._prepare_import, file_paths, file_passwords, file_salts))
+        
+        return [
+            self._add_file(file_path, file_salt, *file_prepared)
+            for file_path, file_salt, file_prepared in zip(file_paths, file_salts, prepared)
+        ]
+    
+    # stat a file and encrypt its content if a password is provided, it doesn't touch
+    # the filesystem state so it is safe to run for several files in parallel
+    def _prepare_import(self, file_path, file_password, file_salt):
         file_stats = os.stat(file_path)
+        if not file_password:
+            return file_stats, None, None
+        
+        file_key, file_nonce = FS_Crypto.derive_key(file_password, file_salt)
+        with open(file_path, 'rb') as f, _map_file(f) as file_data:
+            return file_stats, FS_Crypto.encrypt(file_data, file_key, nonce=file_nonce), file_nonce
+    
+    # append a prepared file to the disk and create its record
+    def _add_file(self, file_path, file_salt, file_stats, encrypted_data, file_nonce):
         file_id = str(uuid.uuid4())
         file_name = os.path.basename(file_path)
         file_path_full = os.path.abspath(file_path)
         
-        # encrypt file data if password is provided
-        file_key = None
-        file_nonce = None
-        if file_password:
-            file_salt = os.urandom(16)
-            file_key, file_nonce = FS_Crypto.derive_key(file_password, file_salt)
-            file_data = FS_Crypto.encrypt(file_data, file_key, nonce=file_nonce)
-
+        # plain files are copied straight from the mapped file into the end of the in-memory disk
         file_position = self._get_next_file_position()
-        file_size = len(file_data)
+        if encrypted_data is None:
+            with open(file_path, 'rb') as f, _map_file(f) as file_data:
+                self._plain += file_data
+        else:
+            self._plain += encrypted_data
+        file_size = len(self._plain) - file_position
         
+        # create file record
         file_record = {
             "id": file_id,
             "filename": file_name,
             "original_path": file_path_full,
             "size": file_size,
-            "original_size": len(file_data) if not file_password else file_stats.st_size,
+            "original_size": file_size if encrypted_data is None else file_stats.st_size,
             "created": datetime.fromtimestamp(file_stats.st_ctime),
             "modified": datetime.fromtimestamp(file_stats.st_mtime),
             "accessed": datetime.fromtimestamp(file_stats.st_atime),
             "imported_date": datetime.now(),
-            "encrypted": bool(file_password),
+            "encrypted": encrypted_data is not None,
             "position": file_position,
             "deleted": False,
             "attributes": {
@@ -220,7 +328,7 @@ class MyFSManager:
             }
         }
         
-        if file_password:
+        if encrypted_data is not None:
             file_record["encryption"] = {
                 "salt": file_salt,
                 "nonce": file_nonce
@@ -228,16 +336,10 @@ class MyFSManager:
         
         # update metadata
         self.file_table.append(file_record)
-        self.metadata["file_count"] += 1
-        
-        if self._is_encrypted():
-            self._decrypt_filesystem()
-
-        with open(self.disk_name, 'r+b') as f:
-            f.seek(file_position)
-            f.write(file_data)
-            
-        self.save_filesystem()
+        self._by_id[file_id] = file_record
+        self._active += 1
+        self._dirty = True
+        self._metadata_dirty = True
         
         return file_id
         
@@ -246,38 +348,40 @@ class MyFSManager:
             raise ValueError("Filesystem is not initialized.")
         
         # check if file exists and is not deleted
-        file_record = next((f for f in self.file_table if f["id"] == file_id and not f.get("deleted", False)), None)
-        if not file_record:
+        file_record = self._by_id.get(file_id)
+        if not file_record or file_record.get("deleted", False):
             raise ValueError(f"File with ID {file_id} not found or is deleted.")
         
-        if self._is_encrypted():
-            self._decrypt_filesystem()
-
-        with open(self.disk_name, 'rb') as f:
-            f.seek(file_record["position"])
-            file_size = file_record["size"]
-            color._print(f"Exporting file {file_record['filename']} of size {file_size} bytes.", color.CORRECT)
-            file_data = f.read(file_size)
-        
-        # decrypt file data if it is encrypted
-        if file_record.get("encrypted", False):
-            if not file_password:
-                raise ValueError("Password required for encrypted file.")
+        file_position = file_record["position"]
+        file_size = file_record["size"]
+        color._print(f"Exporting file {file_record['filename']} of size {file_size} bytes.", color.CORRECT)
+        # read the file straight out of the in-memory disk without copying it,
+        # the view must be released before the disk can be resized again
+        file_view = memoryview(self._plain)[file_position:file_position + file_size]
+        try:
+            file_data = file_view
             
-            try:
-                salt = file_record["encryption"]["salt"]
-                nonce = file_record["encryption"]["nonce"]
-                file_key, file_nonce = FS_Crypto.derive_key(file_password, salt)
-                if nonce != file_nonce:
-                    raise ValueError("Invalid password.")
-                file_data = FS_Crypto.decrypt(file_data, file_key, nonce=nonce)
-            except Exception as e:
-                raise ValueError(f"Failed to decrypt file: {e}")
+            # decrypt file data if it is encrypted
+            if file_record.get("encrypted", False):
+                if not file_password:
+                    raise ValueError("Password required for encrypted file.")
                 
-        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
-        
-        with open(output_path, 'wb') as f:
-            f.write(file_data)
+                try:
+                    salt = file_record["encryption"]["salt"]
+                    nonce = file_record["encryption"]["nonce"]
+                    file_key, file_nonce = FS_Crypto.derive_key(file_password, salt)
+                    if nonce != file_nonce:
+                        raise ValueError("Invalid password.")
+                    file_data = FS_Crypto.decrypt(file_data, file_key, nonce=nonce)
+                except Exception as e:
+                    raise ValueError(f"Failed to decrypt file: {e}")
+                    
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+            
+            with open(output_path, 'wb') as f:
+                f.write(file_data)
+        finally:
+            file_view.release()
         
         # set file attributes like mode, uid, gid, accessed, modified time to match the original file
         try:
@@ -289,8 +393,6 @@ class MyFSManager:
         except Exception as e:
             color._print(f"Failed to set file attributes: {e}", color.WARNING)
             pass
-
-        self._encrypt_filesystem()
     
     # list files available in MyFS
     def list_files(self, include_deleted: bool = False):
@@ -306,77 +408,78 @@ class MyFSManager:
     def delete_file_soft(self, file_id):
         if not self.is_initialized:
             raise ValueError("Filesystem is not initialized.")
-        file_record = next((f for f in self.file_table if f["id"] == file_id and not f.get("deleted", False)), None)
-        if not file_record:
+        file_record = self._by_id.get(file_id)
+        if not file_record or file_record.get("deleted", False):
             raise ValueError(f"File with ID {file_id} not found or is already deleted.")
             
         file_record["deleted"] = True
         file_record["deleted_date"] = datetime.now()
         
-        self.metadata["file_count"] -= 1
-        self.metadata["deleted_count"] += 1
-        
-        self.save_filesystem()
+        self._active -= 1
+        self._deleted += 1
+        self._metadata_dirty = True
     
     # delete a record in MyFS metadata permanently and remove it from the disk
     def delete_file_permanent(self, file_id):
         if not self.is_initialized:
             raise ValueError("Filesystem is not initialized.")
-        file_record = next((f for f in self.file_table if f["id"] == file_id), None)
+        file_record = self._by_id.get(file_id)
         if not file_record:
             raise ValueError(f"File with ID {file_id} not found.")
 
         file_size = file_record.get("size", 0)
         file_position = file_record.get("position", 0)
 
-        if self._is_encrypted():
-            self._decrypt_filesystem()
-
         # reallocate disk space by removing the file data
-        with open(self.disk_name, 'rb') as f:
-            data = f.read()
-        new_data = data[:file_position] + data[file_position + file_size:]
-        with open(self.disk_name, 'wb') as f:
-            f.write(new_data)
+        del self._plain[file_position:file_position + file_size]
+        self._dirty = True
 
         if not file_record.get("deleted", False):
-            self.metadata["file_count"] -= 1
+            self._active -= 1
         else:
-            self.metadata["deleted_count"] -= 1
+            self._deleted -= 1
             
-        self.file_table = [f for f in self.file_table if f["id"] != file_id]
+        index = self.file_table.index(file_record)
+        del self.file_table[index]
+        del self._by_id[file_id]
         # recalculate other files' positions after deletion
-        self._calculate_file_position(file_size, file_position)
-        self.save_filesystem()
+        self._calculate_file_position(file_size, index)
+        self._metadata_dirty = True
     
     # recover a soft-deleted file by marking it as active again in the metadata
     def recover_file(self, file_id):
         if not self.is_initialized:
             raise ValueError("Filesystem is not initialized.")
-        file_record = next((f for f in self.file_table if f["id"] == file_id and f.get("deleted", False)), None)
-        if not file_record:
+        file_record = self._by_id.get(file_id)
+        if not file_record or not file_record.get("deleted", False):
             raise ValueError(f"Deleted file with ID {file_id} not found.")
             
-        active_files = sum(1 for file in self.file_table if not file.get("deleted", False))
-        if active_files >= self.metadata["max_files"]:
+        if self._active >= self.metadata["max_files"]:
             raise ValueError(f"Maximum file count ({self.metadata['max_files']}) reached.")
             
         file_record["deleted"] = False
         file_record.pop("deleted_date", None)
         
-        self.metadata["file_count"] += 1
-        self.metadata["deleted_count"] -= 1
-        
-        self.save_filesystem()
+        self._active += 1
+        self._deleted -= 1
+        self._metadata_dirty = True
+
+    # next 16-byte salt from the pool, refilled with one urandom call every 256 salts
+    def _next_salt(self) -> bytes:
+        if self._salt_offset + 16 > len(self._salt_pool):
+            self._salt_pool = os.urandom(4096)
+            self._salt_offset = 0
+        salt = self._salt_pool[self._salt_offset:self._salt_offset + 16]
+        self._salt_offset += 16
+        return salt
 
     # calculate the next file position in the disk
     def _get_next_file_position(self) -> int:
-        with open(self.disk_name, 'rb') as f:
-            f.seek(0, os.SEEK_END)
-            return f.tell()
+        return len(self._plain)
 
-    # calculate the position of other records after deleted a file
-    def _calculate_file_position(self, file_size: int, file_position: int):
-        for file_record in self.file_table:
-            if file_record.get("position", 0) > file_position:
-                file_record["position"] -= file_size
\ No newline at end of file
+    # calculate the position of other records after deleted a file.
+    # files are appended to the disk in the same order as file_table, so only the records
+    # that came after the deleted one (from its old index) are stored behind it
+    def _calculate_file_position(self, file_size: int, index: int):
+        for file_record in itertools.islice(self.file_table, index, None):
+            file_record["position"] -= file_size
\ No newline at end of file
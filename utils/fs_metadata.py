@@ -1,11 +1,186 @@
 import wmi
+import io
 import os
+import sys
+import hmac
+import time
+import uuid
 import pickle
-from ast import literal_eval
+import hashlib
+import struct
+import msgpack
+import operator
+import functools
+from array import array
+from datetime import datetime, timedelta
 from .fs_crypto import FS_Crypto
 
 
-wmi_instance = wmi.WMI()
+# connecting to WMI is slow, so it only happens the first time a drive is checked
+_wmi_instance = None
+
+def _wmi():
+    global _wmi_instance
+    if _wmi_instance is None:
+        _wmi_instance = wmi.WMI()
+    return _wmi_instance
+
+# drives are listed at most once per interval, repeated checks within it reuse the last listing
+_DRIVE_POLL_INTERVAL = 2.0
+
+# name and volume name of the removable drives, gen_id changes every poll interval
+@functools.lru_cache(maxsize=1)
+def _list_usb_drives_cached(gen_id):
+    return tuple(
+        (disk.Name, disk.VolumeName)
+        for disk in _wmi().Win32_LogicalDisk()
+        if disk.DriveType == 2
+    )
+
+# getter returning the values of the given WMI properties as a tuple, objects of the same
+# class share the same property names and so the same getter
+@functools.lru_cache(maxsize=None)
+def _properties_getter(props):
+    if not props:
+        return lambda wmi_object: ()
+    getter = operator.attrgetter(*props)
+    # attrgetter returns a bare value instead of a tuple for a single attribute
+    if len(props) == 1:
+        return lambda wmi_object: (getter(wmi_object),)
+    return getter
+
+# file table records are stored column by column: one fixed-width column per field
+# instead of serializing every record dict on its own
+_EPOCH = datetime(1970, 1, 1)
+_INT_FIELDS = ("size", "original_size", "position")
+_TIME_FIELDS = ("created", "modified", "accessed", "imported_date")
+_ATTRIBUTE_FIELDS = ("mode", "uid", "gid")
+# record flags
+_DELETED = 1
+_ENCRYPTED = 2
+_HAS_DELETED_DATE = 4
+
+def _to_micros(value: datetime) -> int:
+    return (value - _EPOCH) // timedelta(microseconds=1)
+
+def _from_micros(value: int) -> datetime:
+    return _EPOCH + timedelta(microseconds=value)
+
+# version of the metadata format. 1.0 metadata was a pickled dict, which starts with the pickle
+# PROTO opcode; current metadata is a msgpack map of more than 0 fields and never starts with it
+_FORMAT_VERSION = "2.0"
+_PICKLE_PROTO = b"\x80"
+
+# 1.0 metadata only ever pickled builtins and datetimes, any other global in the payload
+# is refused instead of being imported and called
+class _LegacyUnpickler(pickle.Unpickler):
+    def find_class(self, module, name):
+        if (module, name) == ("datetime", "datetime"):
+            return datetime
+        raise pickle.UnpicklingError(f"Global {module}.{name} is not allowed in metadata.")
+
+# msgpack extension for the datetime fields, stored as the same microsecond count
+_DATETIME_EXT = 1
+
+def _encode_ext(value):
+    if isinstance(value, datetime):
+        return msgpack.ExtType(_DATETIME_EXT, struct.pack("<q", _to_micros(value)))
+    raise TypeError(f"Cannot serialize {type(value).__name__} in metadata.")
+
+def _decode_ext(code, data):
+    if code == _DATETIME_EXT:
+        return _from_micros(struct.unpack("<q", data)[0])
+    return msgpack.ExtType(code, data)
+
+# layout: record count, ids, int64 columns (ints, timestamps, deleted date, attributes,
+# name and path lengths), flags, salts, nonces, then the utf-8 names and paths
+def _pack_file_table(file_table) -> bytes:
+    names = [record["filename"].encode() for record in file_table]
+    paths = [record["original_path"].encode() for record in file_table]
+    encryption = [record.get("encryption") for record in file_table]
+
+    columns = array("q")
+    for field in _INT_FIELDS:
+        columns.extend(record[field] for record in file_table)
+    for field in _TIME_FIELDS:
+        columns.extend(_to_micros(record[field]) for record in file_table)
+    columns.extend(_to_micros(record["deleted_date"]) if "deleted_date" in record else 0 for record in file_table)
+    for field in _ATTRIBUTE_FIELDS:
+        columns.extend(record["attributes"][field] for record in file_table)
+    columns.extend(map(len, names))
+    columns.extend(map(len, paths))
+    if sys.byteorder == "big":
+        columns.byteswap()
+
+    flags = bytes(
+        (_DELETED if record.get("deleted", False) else 0)
+        | (_ENCRYPTED if record.get("encrypted", False) else 0)
+        | (_HAS_DELETED_DATE if "deleted_date" in record else 0)
+        for record in file_table
+    )
+
+    return b"".join((
+        struct.pack("<I", len(file_table)),
+        b"".join(uuid.UUID(record["id"]).bytes for record in file_table),
+        columns.tobytes(),
+        flags,
+        b"".join(e["salt"] if e else bytes(16) for e in encryption),
+        b"".join(e["nonce"] if e else bytes(12) for e in encryption),
+        *names,
+        *paths
+    ))
+
+def _unpack_file_table(blob: bytes):
+    count = struct.unpack_from("<I", blob)[0]
+    offset = 4
+
+    def take(size):
+        nonlocal offset
+        offset += size
+        return blob[offset - size:offset]
+
+    ids = take(16 * count)
+    columns = array("q")
+    column_count = len(_INT_FIELDS) + len(_TIME_FIELDS) + 1 + len(_ATTRIBUTE_FIELDS) + 2
+    columns.frombytes(take(columns.itemsize * column_count * count))
+    if sys.byteorder == "big":
+        columns.byteswap()
+    flags = take(count)
+    salts = take(16 * count)
+    nonces = take(12 * count)
+
+    def column(index):
+        return columns[index * count:(index + 1) * count]
+
+    int_columns = [column(i) for i in range(len(_INT_FIELDS))]
+    time_columns = [column(len(_INT_FIELDS) + i) for i in range(len(_TIME_FIELDS))]
+    deleted_dates = column(len(_INT_FIELDS) + len(_TIME_FIELDS))
+    attribute_columns = [column(len(_INT_FIELDS) + len(_TIME_FIELDS) + 1 + i) for i in range(len(_ATTRIBUTE_FIELDS))]
+    names = [take(length).decode() for length in column(column_count - 2)]
+    paths = [take(length).decode() for length in column(column_count - 1)]
+
+    file_table = []
+    for i in range(count):
+        record = {
+            "id": str(uuid.UUID(bytes=ids[16 * i:16 * (i + 1)])),
+            "filename": names[i],
+            "original_path": paths[i],
+        }
+        record.update((field, values[i]) for field, values in zip(_INT_FIELDS, int_columns))
+        record.update((field, _from_micros(values[i])) for field, values in zip(_TIME_FIELDS, time_columns))
+        record["encrypted"] = bool(flags[i] & _ENCRYPTED)
+        record["deleted"] = bool(flags[i] & _DELETED)
+        record["attributes"] = {field: values[i] for field, values in zip(_ATTRIBUTE_FIELDS, attribute_columns)}
+        if record["encrypted"]:
+            record["encryption"] = {
+                "salt": salts[16 * i:16 * (i + 1)],
+                "nonce": nonces[12 * i:12 * (i + 1)]
+            }
+        if flags[i] & _HAS_DELETED_DATE:
+            record["deleted_date"] = _from_micros(deleted_dates[i])
+        file_table.append(record)
+
+    return file_table
 
 class Metadata:
     """Metadata class for managing filesystem metadata on a USB drive."""
@@ -15,25 +190,35 @@ class Metadata:
     metadata = {
         "creation_date": None,
         "last_modified": None,
-        "version": "1.0",
+        "version": _FORMAT_VERSION,
         "salt": None,
         "identifier": None,
+        "verifier": None,
         "max_files": 100,
         "file_count": 0,
         "deleted_count": 0,
         "file_table": None
     }
+    # key the metadata file was last read or written with while metadata is unchanged since,
+    # reading it again with the same key is served from memory
+    _cache_key = None
+    # metadata key and nonce of the last password used, the salt is derived from the password
+    # itself so the same password always gives the same key
+    _cached_key = None
+    _cached_nonce = None
+    _cached_pw_hash = None
 
     @staticmethod
     def _wmi2dict(wmi_object):
-        return dict((attr, getattr(wmi_object, attr)) for attr in wmi_object.__dict__['_properties'])
+        props = tuple(wmi_object.__dict__['_properties'])
+        return dict(zip(props, _properties_getter(props)(wmi_object)))
     
     @staticmethod
     def check_usb():
         # check if the drive is a USB drive with VolumeName "RKEY"
-        for disk in wmi_instance.Win32_LogicalDisk():
-            if disk.DriveType == 2 and disk.VolumeName == "RKEY":
-                return disk.Name
+        for name, volume_name in _list_usb_drives_cached(time.monotonic() // _DRIVE_POLL_INTERVAL):
+            if volume_name == "RKEY":
+                return name
         return None
 
     @classmethod
@@ -45,49 +230,114 @@ class Metadata:
         else:
             return None
         
+    # derive the metadata key and nonce, PBKDF2 only runs again when the password changes
     @classmethod
-    def write_metadata(self, password: str):
+    def _get_keys(self, password: str):
+        pw_hash = hashlib.sha256(password.encode()).digest()
+        if self._cached_pw_hash is None or not hmac.compare_digest(pw_hash, self._cached_pw_hash):
+            self._cached_key, self._cached_nonce = FS_Crypto.derive_key(
+                password,
+                FS_Crypto.get_metadata_salt(password)
+            )
+            self._cached_pw_hash = pw_hash
+        
+        return self._cached_key, self._cached_nonce
+
+    # encrypt data with the password's metadata key and write it to the metadata file,
+    # the file is created if it does not exist
+    @classmethod
+    def _encrypt_to_file(self, password: str, data: bytes):
         if not self.metadata_path:
             raise ValueError("Metadata path is not set.")
-        if not os.path.exists(self.metadata_path):
-            raise FileNotFoundError("Metadata file does not exist.")
         
-        # encrypt before writing
-        key, nonce = FS_Crypto.derive_key(
-            password,
-            FS_Crypto.get_hash(password.encode()).encode()
-        )
-        encrypted_metadata = FS_Crypto.encrypt(pickle.dumps(self.metadata), key, nonce)
-
+        key, nonce = self._get_keys(password)
+        encrypted_metadata = FS_Crypto.encrypt(data, key, nonce, reuse_key=True)
         with open(self.metadata_path, 'wb') as f:
             f.write(encrypted_metadata)
 
+    # read the metadata file and decrypt it with the password's metadata key,
+    # a missing file is reported by open itself
     @classmethod
-    def read_metadata(self, password: str):
+    def _decrypt_from_file(self, password: str) -> bytes:
         if not self.metadata_path:
             raise ValueError("Metadata path is not set.")
-        if not os.path.exists(self.metadata_path):
-            raise FileNotFoundError("Metadata file does not exist.")
         
+        key, nonce = self._get_keys(password)
         with open(self.metadata_path, 'rb') as f:
             encrypted_metadata = f.read()
         
-        # decrypt before reading
-        key, nonce = FS_Crypto.derive_key(
-            password,
-            FS_Crypto.get_hash(password.encode()).encode()
-        )
-
         decrypted_metadata = FS_Crypto.decrypt(encrypted_metadata, key, nonce)
         if decrypted_metadata is None:
             raise ValueError("Decryption failed. Check your password.")
-        self.metadata = pickle.loads(decrypted_metadata)
+        return decrypted_metadata
+
+    @classmethod
+    def write_metadata(self, password: str):
+        file_table = self.metadata["file_table"]
+        stored_metadata = dict(self.metadata, file_table=None if file_table is None else _pack_file_table(file_table))
+        self._encrypt_to_file(
+            password,
+            msgpack.packb(stored_metadata, use_bin_type=True, default=_encode_ext)
+        )
+        self._cache_key = self._get_keys(password)[0]
+
+    @classmethod
+    def read_metadata(self, password: str):
+        key = self._get_keys(password)[0]
+        if self._cache_key is not None and hmac.compare_digest(key, self._cache_key):
+            return self.metadata
+
+        decrypted_metadata = self._decrypt_from_file(password)
+        if decrypted_metadata[:1] == _PICKLE_PROTO:
+            self.metadata = self._read_legacy(decrypted_metadata)
+        else:
+            self.metadata = msgpack.unpackb(decrypted_metadata, raw=False, ext_hook=_decode_ext)
+            if self.metadata["file_table"] is not None:
+                self.metadata["file_table"] = _unpack_file_table(self.metadata["file_table"])
+        self._cache_key = key
 
         return self.metadata
     
+    # load metadata written by version 1.0, it was authenticated with the password's key
+    # just like the current format. it has no password verifier yet, the caller seals one
+    # with the master key and writes the metadata again in the current format
+    @staticmethod
+    def _read_legacy(decrypted_metadata: bytes):
+        try:
+            metadata = _LegacyUnpickler(io.BytesIO(decrypted_metadata)).load()
+        except Exception as e:
+            raise ValueError(f"Metadata was created by an older version and could not be read: {e}")
+        metadata.setdefault("verifier", None)
+        # some 1.0 metadata already holds the packed file table instead of the list of records
+        if isinstance(metadata["file_table"], bytes):
+            metadata["file_table"] = _unpack_file_table(metadata["file_table"])
+        return metadata
+
+    # whether the metadata in memory still has to be upgraded from an older format
+    @classmethod
+    def is_legacy(self):
+        return self.metadata.get("version") != _FORMAT_VERSION or self.metadata.get("verifier") is None
+
+    # bring metadata from an older format to the current version, write_metadata persists it
+    @classmethod
+    def upgrade_legacy(self, verifier: bytes):
+        self.update_many({"version": _FORMAT_VERSION, "verifier": verifier})
+    
     @classmethod
     def update_metadata(self, field, value):
         if field not in self.metadata:
             raise KeyError(f"Field '{field}' does not exist in metadata.")
         
-        self.metadata[field] = value
\ No newline at end of file
+        self.metadata[field] = value
+        self._cache_key = None
+
+    # update several fields at once, nothing is changed if one of them does not exist.
+    # like update_metadata it only touches memory, write_metadata persists the changes
+    @classmethod
+    def update_many(self, fields: dict):
+        for field in fields:
+            if field not in self.metadata:
+                raise KeyError(f"Field '{field}' does not exist in metadata.")
+        
+        self.metadata.update(fields)
+        self._cache_key = None
\ No newline at end of file